@@ -8,180 +8,341 @@
 # - Auto-matching Stitch → VALR deposits
 # - Stores everything in Supabase
 
-from fastapi import FastAPI
+from fastapi import BackgroundTasks, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import os, httpx, hmac, hashlib, time
-from datetime import datetime
-
-app = FastAPI(title="Netzer Backend", version="1.5")
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Annotated, Literal
+from contextlib import asynccontextmanager
+import os, asyncio, logging, httpx, time, orjson
+from collections import defaultdict
+from common import Fields, Limit, Offset, now_iso, page_params, valr_signature, wrap_rows
+
+logger = logging.getLogger("netzer")
+
+VALR_BASE_URL = "https://api.valr.com"
+VALR_DEPOSIT_HISTORY_PATH = "/v1/account/deposit-history"
+
+# Uvicorn reads WEB_CONCURRENCY as its default --workers; every worker opens its own
+# pools, so per-worker limits are divided down to keep the total into Supabase bounded.
+WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+# Idle seconds before a pooled connection is dropped (httpx default is 5s)
+KEEPALIVE_EXPIRY = 60.0
+
+def pool_limits(keepalive: int, total: int) -> httpx.Limits:
+    """Split an app-wide connection budget across the Uvicorn workers."""
+    return httpx.Limits(
+        max_keepalive_connections=max(1, keepalive // WORKERS),
+        max_connections=max(1, total // WORKERS),
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open one pooled client per upstream host and close them on shutdown."""
+    app.state.sb = httpx.AsyncClient(
+        base_url=f"{SUPABASE_URL}/rest/v1",
+        headers=SB_HEADERS,
+        http2=True,
+        limits=pool_limits(keepalive=32, total=128),
+        timeout=httpx.Timeout(20.0),
+    )
+    app.state.valr = httpx.AsyncClient(
+        base_url=VALR_BASE_URL,
+        http2=True,
+        limits=pool_limits(keepalive=20, total=100),
+        timeout=httpx.Timeout(30.0),
+    )
+    yield
+    await app.state.sb.aclose()
+    await app.state.valr.aclose()
+
+app = FastAPI(
+    title="Netzer Backend",
+    version="1.5",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 # --- Environment Variables (Render -> Environment tab) ---
-SUPABASE_URL = os.getenv("SUPABASE_URL")            # e.g. https://xxxx.supabase.co
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")            # Supabase service_role key
+SUPABASE_URL = os.getenv("SUPABASE_URL", "").rstrip("/")  # e.g. https://xxxx.supabase.co
+SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")        # Supabase service_role key
 VALR_API_KEY = os.getenv("VALR_API_KEY")            # VALR Read-only API key
 VALR_API_SECRET = os.getenv("VALR_API_SECRET")      # VALR API secret
 
+# --- Supabase headers (built once; the client sends SB_HEADERS by default) ---
+SB_HEADERS = {
+    "apikey": SUPABASE_KEY,
+    "Authorization": f"Bearer {SUPABASE_KEY}",
+    "Content-Type": "application/json",
+}
+SB_PREFER_REPRESENTATION = {"Prefer": "return=representation"}
+SB_PREFER_MINIMAL = {"Prefer": "return=minimal"}
+SB_PREFER_MERGE = {"Prefer": "resolution=merge-duplicates,return=minimal"}
+
+# Attempts for background Supabase writes (webhook has already been acked)
+SB_WRITE_ATTEMPTS = 3
+SB_RETRY_BACKOFF = 0.5  # seconds before the first retry, doubled after each one
+
+# --- Read cache TTLs (seconds) for dashboard polling ---
+# The cache is per worker and a webhook only invalidates the worker that handled it,
+# so with WORKERS > 1 other workers can serve results without a new deposit until
+# their entry expires; the TTLs are shortened to bound that window.
+DEPOSITS_CACHE_TTL = 30 if WORKERS == 1 else 5
+VALR_DEPOSITS_CACHE_TTL = 10 if WORKERS == 1 else 5
+# Keys include client-chosen paging params, so the cache is capped per worker
+READ_CACHE_MAX_ENTRIES = 64
+
+# Stitch deposits within this many ZAR of a VALR deposit are treated as the same funds
+MATCH_TOLERANCE_ZAR = 5
+
 # --- CORS setup ---
 ALLOWED_ORIGINS = [
     "http://localhost:5173",                        # local dev
     "https://netzer-backend.onrender.com",         # backend (Render)
     "https://netzer-dashboard.replit.app",         # frontend (Replit)
-    "*",                                           # open for now
 ]
 app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
-    allow_credentials=True,
+    allow_credentials=False,                       # no cookies: the dashboard sends no credentials
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
 # ---------- Models ----------
+Amount = Annotated[float, Field(ge=0)]
+
 class Deposit(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     client_id: str
-    amount_zar: float
+    amount_zar: Amount
     stitch_txid: str
 
 class Withdrawal(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     client_id: str
-    amount_zar: float
+    amount_zar: Amount
     withdraw_txid: str
 
+class NAVRequest(BaseModel):
+    client_id: str
+    deposit_zar: float
+    zar_to_usdt_rate: float = Field(gt=0)
+    trade_fee_rate: float = 0.001
+    withdrawal_fee_usdt: float = 1.0
+    fund_model: Literal["buffer", "fee_adjusted"] = "fee_adjusted"
+
 # ---------- Helpers ----------
-def sign_valr_request(method: str, path: str, body: str = ""):
-    """Generate HMAC-SHA512 signature for VALR API requests."""
-    timestamp = str(int(time.time() * 1000))
-    payload = timestamp + method + path + body
-    signature = hmac.new(
-        VALR_API_SECRET.encode("utf-8"),
-        payload.encode("utf-8"),
-        hashlib.sha512
-    ).hexdigest()
-    return timestamp, signature
-
-def sb_headers():
-    return {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json"
-    }
+def build_stitch_index(stitch_data):
+    """Bucket Stitch deposits by amount so each VALR row only checks nearby buckets."""
+    buckets = defaultdict(list)
+    for order, s in enumerate(stitch_data):
+        amount = float(s["amount_zar"])
+        buckets[int(amount // MATCH_TOLERANCE_ZAR)].append(
+            (order, amount, s["client_id"], s["stitch_txid"])
+        )
+    return buckets
+
+def match_stitch_deposit(buckets, amount: float):
+    """Return (client_id, stitch_txid) of the first Stitch deposit within tolerance."""
+    key = int(amount // MATCH_TOLERANCE_ZAR)
+    best = None
+    for k in (key - 1, key, key + 1):
+        for entry in buckets.get(k, ()):
+            if abs(entry[1] - amount) <= MATCH_TOLERANCE_ZAR and (best is None or entry[0] < best[0]):
+                best = entry
+                break
+    return (best[2], best[3]) if best else (None, None)
+
+def match_by_reference(stitch_by_txid, description: str):
+    """Return (client_id, stitch_txid) if the VALR bank reference carries a known Stitch txid."""
+    for token in (description or "").replace(",", " ").split():
+        client_id = stitch_by_txid.get(token)
+        if client_id is not None:
+            return client_id, token
+    return None, None
+
+# ---------- Read cache (per worker) ----------
+_read_cache = {}
+
+def cache_get(key: tuple):
+    """Return the cached value for key, or None if missing or expired."""
+    hit = _read_cache.get(key)
+    if hit and hit[0] > time.monotonic():
+        return hit[1]
+    return None
+
+def cache_set(key: tuple, value, ttl: float):
+    """Store value for ttl seconds, dropping expired entries and the oldest past the size cap."""
+    now = time.monotonic()
+    _read_cache.pop(key, None)
+    for k in [k for k, (expires, _) in _read_cache.items() if expires <= now]:
+        del _read_cache[k]
+    while len(_read_cache) >= READ_CACHE_MAX_ENTRIES:
+        del _read_cache[next(iter(_read_cache))]
+    _read_cache[key] = (now + ttl, value)
+
+def cache_invalidate(*names: str):
+    """Drop every cached entry whose key starts with one of the given endpoint names."""
+    for key in [k for k in _read_cache if k[0] in names]:
+        del _read_cache[key]
+
+async def insert_deposit(client: httpx.AsyncClient, record: dict):
+    """
+    Store a Stitch deposit in Supabase, retrying transient failures with backoff.
+    Stitch has already been acked and will not redeliver, so a 409 on stitch_txid
+    (an earlier attempt that timed out but committed) counts as stored.
+    """
+    error = None
+    for attempt in range(SB_WRITE_ATTEMPTS):
+        if attempt:
+            await asyncio.sleep(SB_RETRY_BACKOFF * 2 ** (attempt - 1))
+        try:
+            resp = await client.post("/deposits", headers=SB_PREFER_MINIMAL, json=record)
+        except httpx.HTTPError as e:
+            error = repr(e)
+            continue
+        if resp.status_code < 300 or (resp.status_code == 409 and "stitch_txid" in resp.text):
+            # A new deposit changes both the list and what VALR deposits can match
+            cache_invalidate("deposits", "valr_deposits")
+            return
+        error = f"HTTP {resp.status_code}: {resp.text}"
+        if resp.status_code < 500:
+            break
+    logger.error("Stitch deposit %s not stored: %s", record["stitch_txid"], error)
+
+async def insert_fee(client: httpx.AsyncClient, record: dict):
+    """Store a NAV fee row in Supabase; runs after the NAV response, so failures are logged."""
+    try:
+        resp = await client.post("/fees", headers=SB_PREFER_MINIMAL, json=record)
+    except httpx.HTTPError as e:
+        logger.error("Fee row for %s not stored: %r", record["client_id"], e)
+        return
+    if resp.status_code >= 300:
+        logger.error("Fee row for %s not stored: HTTP %s: %s", record["client_id"], resp.status_code, resp.text)
 
 # ---------- Webhook: Stitch deposit ----------
-@app.post("/webhooks/stitch")
-async def handle_stitch_webhook(deposit: Deposit):
-    """Receive deposit from Stitch and store in Supabase (triggered by Stitch webhook)."""
+@app.post("/webhooks/stitch", response_model=None)
+async def handle_stitch_webhook(deposit: Deposit, request: Request, bg: BackgroundTasks):
+    """
+    Receive deposit from Stitch (triggered by Stitch webhook) and ack immediately;
+    the Supabase insert runs as a background task after the response is sent.
+    """
     record = {
         "client_id": deposit.client_id,
         "amount_zar": deposit.amount_zar,
         "stitch_txid": deposit.stitch_txid,
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": now_iso(),
         "status": "completed",
     }
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            f"{SUPABASE_URL}/rest/v1/deposits",
-            headers={**sb_headers(), "Prefer": "return=representation"},
-            json=record,
-            timeout=20,
-        )
-    return {"ok": resp.status_code < 300, "data": resp.json() if resp.status_code < 300 else resp.text}
+    bg.add_task(insert_deposit, request.app.state.sb, record)
+    return {"ok": True, "data": record}
 
 # ---------- List Deposits ----------
 @app.get("/deposits")
-async def list_deposits():
-    """Return all Stitch deposits from Supabase."""
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(
-            f"{SUPABASE_URL}/rest/v1/deposits?select=*",
-            headers=sb_headers(),
-            timeout=20,
-        )
-    return {"ok": resp.status_code < 300, "deposits": resp.json() if resp.status_code < 300 else resp.text}
+async def list_deposits(request: Request, limit: Limit = 100, offset: Offset = 0, fields: Fields = "*"):
+    """
+    Return a page of Stitch deposits from Supabase, newest first
+    (cached for DEPOSITS_CACHE_TTL seconds). `fields` is a PostgREST select list.
+    """
+    key = ("deposits", fields, limit, offset)
+    cached = cache_get(key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    resp = await request.app.state.sb.get("/deposits", params=page_params(fields, limit, offset, order="timestamp.desc"))
+    if resp.status_code >= 300:
+        return {"ok": False, "deposits": resp.text}
+    body = wrap_rows("deposits", resp.content)
+    cache_set(key, body, DEPOSITS_CACHE_TTL)
+    return Response(content=body, media_type="application/json")
 
 # ---------- Webhook: Withdraw ----------
-@app.post("/webhooks/withdraw")
-async def handle_withdraw_request(withdraw: Withdrawal):
+@app.post("/webhooks/withdraw", response_model=None)
+async def handle_withdraw_request(withdraw: Withdrawal, request: Request):
     """Receive withdrawal request and store in Supabase."""
     record = {
         "client_id": withdraw.client_id,
         "amount_zar": withdraw.amount_zar,
         "withdraw_txid": withdraw.withdraw_txid,
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": now_iso(),
         "status": "pending",
     }
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            f"{SUPABASE_URL}/rest/v1/withdrawals",
-            headers={**sb_headers(), "Prefer": "return=representation"},
-            json=record,
-            timeout=20,
-        )
-    return {"ok": resp.status_code < 300, "data": resp.json() if resp.status_code < 300 else resp.text}
+    resp = await request.app.state.sb.post(
+        "/withdrawals",
+        headers=SB_PREFER_REPRESENTATION,
+        json=record,
+    )
+    return {"ok": resp.status_code < 300, "data": orjson.loads(resp.content) if resp.status_code < 300 else resp.text}
 
 # ---------- List Withdrawals ----------
 @app.get("/withdrawals")
-async def list_withdrawals():
-    """Return all withdrawals from Supabase."""
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(
-            f"{SUPABASE_URL}/rest/v1/withdrawals?select=*",
-            headers=sb_headers(),
-            timeout=20,
-        )
-    return {"ok": resp.status_code < 300, "withdrawals": resp.json() if resp.status_code < 300 else resp.text}
+async def list_withdrawals(request: Request, limit: Limit = 100, offset: Offset = 0, fields: Fields = "*"):
+    """Return a page of withdrawals from Supabase, newest first. `fields` is a PostgREST select list."""
+    resp = await request.app.state.sb.get("/withdrawals", params=page_params(fields, limit, offset, order="timestamp.desc"))
+    if resp.status_code >= 300:
+        return {"ok": False, "withdrawals": resp.text}
+    return Response(content=wrap_rows("withdrawals", resp.content), media_type="application/json")
 
 # ---------- VALR Deposits ----------
 @app.get("/valr/deposits")
-async def get_valr_deposits():
+async def get_valr_deposits(request: Request):
     """
     Fetch ZAR deposit history from VALR (read-only),
-    store results in Supabase, and match Stitch deposits by amount.
+    store results in Supabase, and match Stitch deposits by the stitch_txid
+    quoted in the bank reference, falling back to amount.
     """
     if not VALR_API_KEY or not VALR_API_SECRET:
         return {"ok": False, "error": "VALR API keys not set in environment"}
 
+    cached = cache_get(("valr_deposits",))
+    if cached is not None:
+        return cached
+
     try:
-        path = "/v1/account/deposit-history"
-        timestamp, signature = sign_valr_request("GET", path)
+        path = VALR_DEPOSIT_HISTORY_PATH
+        timestamp, signature = valr_signature(b"GET", path)
         headers = {
             "X-VALR-API-KEY": VALR_API_KEY,
             "X-VALR-SIGNATURE": signature,
             "X-VALR-TIMESTAMP": timestamp,
         }
 
-        # Fetch deposits from VALR
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(f"https://api.valr.com{path}", headers=headers, timeout=30)
+        # Fetch VALR deposits and existing Stitch deposits concurrently
+        resp, stitch_resp = await asyncio.gather(
+            request.app.state.valr.get(path, headers=headers),
+            request.app.state.sb.get(
+                "/deposits",
+                params={"select": "client_id,amount_zar,stitch_txid", "status": "eq.completed"},
+            ),
+            return_exceptions=True,
+        )
+        if isinstance(resp, Exception):
+            raise resp
         if resp.status_code >= 300:
             return {"ok": False, "error": f"VALR HTTP {resp.status_code}: {resp.text}"}
 
-        valr_data = resp.json() or []
+        valr_data = orjson.loads(resp.content) or []
+        amounts = [float(v.get("amount") or 0) for v in valr_data]
 
-        # Fetch existing Stitch deposits
-        async with httpx.AsyncClient() as client:
-            stitch_resp = await client.get(
-                f"{SUPABASE_URL}/rest/v1/deposits?select=client_id,amount_zar,stitch_txid,timestamp",
-                headers=sb_headers(),
-                timeout=20,
-            )
-        stitch_data = stitch_resp.json() if stitch_resp.status_code < 300 else []
+        # A failed Stitch lookup only means nothing matches; VALR rows are still stored
+        stitch_data = []
+        if not isinstance(stitch_resp, Exception) and stitch_resp.status_code < 300:
+            stitch_data = orjson.loads(stitch_resp.content)
 
         # Prepare VALR records + match
+        stitch_index = build_stitch_index(stitch_data)
+        stitch_by_txid = {s["stitch_txid"]: s["client_id"] for s in stitch_data}
         matched_records = []
-        for v in valr_data:
-            amount = float(v.get("amount") or 0)
+        for v, amount in zip(valr_data, amounts):
             created = v.get("createdAt")
             status = v.get("status")
             desc = v.get("description", "")
-            matched_client = None
-            matched_txid = None
-
-            for s in stitch_data:
-                if abs(float(s["amount_zar"]) - amount) <= 5:
-                    matched_client = s["client_id"]
-                    matched_txid = s["stitch_txid"]
-                    break
+            matched_client, matched_txid = match_by_reference(stitch_by_txid, desc)
+            if matched_txid is None:
+                matched_client, matched_txid = match_stitch_deposit(stitch_index, amount)
 
             matched_records.append({
                 "valr_id": v.get("id"),
@@ -195,102 +356,93 @@ async def get_valr_deposits():
             })
 
         # Upsert into Supabase table "valr_deposits"
-        async with httpx.AsyncClient() as client:
-            insert = await client.post(
-                f"{SUPABASE_URL}/rest/v1/valr_deposits",
-                headers={**sb_headers(), "Prefer": "resolution=merge-duplicates"},
-                json=matched_records,
-                timeout=30,
-            )
-
-        return {
+        insert = await request.app.state.sb.post(
+            "/valr_deposits",
+            headers=SB_PREFER_MERGE,
+            json=matched_records,
+            timeout=30,
+        )
+        if insert.status_code >= 300:
+            # Not cached, so the next call retries the sync
+            return {"ok": False, "error": f"Supabase HTTP {insert.status_code}: {insert.text}"}
+
+        result = {
             "ok": True,
             "inserted": len(matched_records),
             "valr_deposits": matched_records
         }
+        cache_set(("valr_deposits",), result, VALR_DEPOSITS_CACHE_TTL)
+        return result
 
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
 # ---------- Health Check ----------
-@app.get("/")
-def health_check():
-    """Basic health check endpoint."""
-    return {"status": "Netzer backend live (Supabase + VALR matching enabled)"}
+_HEALTH_BODY = orjson.dumps({"status": "Netzer backend live (Supabase + VALR matching enabled)"})
+
+@app.get("/", response_class=Response)
+async def health_check():
+    """Basic health check endpoint (body serialized once at import)."""
+    return Response(content=_HEALTH_BODY, media_type="application/json")
+
+@app.head("/", response_class=Response)
+async def health_check_head():
+    """Header-only health check for load balancer / uptime probes."""
+    return Response(media_type="application/json")
 
-@app.post("/nav/calculate")
-async def calculate_nav(data: dict):
+@app.post("/nav/calculate", response_model=None)
+async def calculate_nav(req: NAVRequest, request: Request, bg: BackgroundTasks):
     """
     Calculate client NAV and record fee breakdown in Supabase.
     ----------------------------------------------------------------
-    JSON Body:
+    JSON Body (validated by NAVRequest; invalid input returns 422):
     {
       "client_id": "string",            # required
       "deposit_zar": float,             # required, client deposit
-      "zar_to_usdt_rate": float,        # required, exchange rate
+      "zar_to_usdt_rate": float,        # required, exchange rate (> 0)
       "trade_fee_rate": float = 0.001,  # optional, default 0.1%
       "withdrawal_fee_usdt": float = 1, # optional, default 1 USDT
       "fund_model": "fee_adjusted"      # optional, 'buffer' or 'fee_adjusted'
     }
     ----------------------------------------------------------------
-    Returns NAV details + logs fee to Supabase.
+    Returns NAV details; the fee row is written to Supabase in the background.
     """
 
-    try:
-        # --- Input parsing with defaults ---
-        cid: str = data["client_id"]
-        deposit_zar: float = float(data["deposit_zar"])
-        rate: float = float(data["zar_to_usdt_rate"])
-        trade_fee_rate: float = float(data.get("trade_fee_rate", 0.001))
-        withdrawal_fee_usdt: float = float(data.get("withdrawal_fee_usdt", 1))
-        model: str = data.get("fund_model", "fee_adjusted")
-
-        # --- Core NAV math ---
-        gross_usdt = deposit_zar / rate               # ZAR→USDT conversion
-        trade_fee_usdt = gross_usdt * trade_fee_rate  # trading fee in USDT
-
-        if model == "buffer":
-            # You (Netzer) absorb fees; client invests full amount
-            nav_units = gross_usdt
-        else:
-            # Client invests net of fees
-            nav_units = gross_usdt - trade_fee_usdt - withdrawal_fee_usdt
-
-        # --- Record fee data in Supabase ---
-        record = {
-            "client_id": cid,
-            "trade_fee": round(trade_fee_usdt, 6),
-            "withdrawal_fee": round(withdrawal_fee_usdt, 6),
-            "fund_model": model,
-        }
+    # --- Core NAV math ---
+    gross_usdt = req.deposit_zar / req.zar_to_usdt_rate   # ZAR→USDT conversion
+    trade_fee_usdt = gross_usdt * req.trade_fee_rate      # trading fee in USDT
+    withdrawal_fee_usdt = req.withdrawal_fee_usdt
 
-        async with httpx.AsyncClient() as client:
-            await client.post(
-                f"{SUPABASE_URL}/rest/v1/fees",
-                headers={
-                    "apikey": SUPABASE_KEY,
-                    "Authorization": f"Bearer {SUPABASE_KEY}",
-                    "Content-Type": "application/json",
-                    "Prefer": "return=representation",
-                },
-                json=record,
-                timeout=20,
-            )
-
-        # --- Return NAV summary ---
-        return {
-            "ok": True,
-            "client_id": cid,
-            "fund_model": model,
-            "gross_usdt": round(gross_usdt, 6),
-            "nav_units": round(nav_units, 6),
-            "trade_fee_usdt": round(trade_fee_usdt, 6),
-            "withdrawal_fee_usdt": round(withdrawal_fee_usdt, 6),
-            "total_fees_usdt": round(trade_fee_usdt + withdrawal_fee_usdt, 6),
-        }
+    if req.fund_model == "buffer":
+        # You (Netzer) absorb fees; client invests full amount
+        nav_units = gross_usdt
+    else:
+        # Client invests net of fees
+        nav_units = gross_usdt - trade_fee_usdt - withdrawal_fee_usdt
 
-    except Exception as e:
-        return {"ok": False, "error": str(e)}
+    trade_fee = round(trade_fee_usdt, 6)
+    withdrawal_fee = round(withdrawal_fee_usdt, 6)
+
+    # --- Record fee data in Supabase (after the response is sent) ---
+    record = {
+        "client_id": req.client_id,
+        "trade_fee": trade_fee,
+        "withdrawal_fee": withdrawal_fee,
+        "fund_model": req.fund_model,
+    }
+    bg.add_task(insert_fee, request.app.state.sb, record)
+
+    # --- Return NAV summary ---
+    return {
+        "ok": True,
+        "client_id": req.client_id,
+        "fund_model": req.fund_model,
+        "gross_usdt": round(gross_usdt, 6),
+        "nav_units": round(nav_units, 6),
+        "trade_fee_usdt": trade_fee,
+        "withdrawal_fee_usdt": withdrawal_fee,
+        "total_fees_usdt": round(trade_fee_usdt + withdrawal_fee_usdt, 6),
+    }
 
 from routes_valr_trade import router as trade_router
 app.include_router(trade_router)
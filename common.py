@@ -0,0 +1,34 @@
+# common.py — helpers shared by app.py and routes_valr_trade.py
+from fastapi import Query
+from typing import Annotated
+import os, time, hmac, hashlib
+from datetime import datetime, timezone
+
+# VALR HMAC-SHA512 key, set up once; each signature copies it instead of redoing the key schedule
+_VALR_HMAC = hmac.new(os.getenv("VALR_API_SECRET", "").encode("utf-8"), digestmod=hashlib.sha512)
+
+# Paging / projection query params for the Supabase list endpoints.
+# Fields only admits plain column names (or *): these reads use the service-role key,
+# so PostgREST embedding like "*,other_table(*)" must not reach select=.
+Limit = Annotated[int, Query(ge=1, le=1000)]
+Offset = Annotated[int, Query(ge=0)]
+Fields = Annotated[str, Query(pattern=r"^(\*|[a-z_]+(,[a-z_]+)*)$")]
+
+def valr_signature(method: bytes, path: str, body: bytes = b""):
+    """Return (timestamp, signature) for a VALR request; method is upper-case bytes, body the exact bytes sent."""
+    timestamp = str(int(time.time() * 1000))
+    h = _VALR_HMAC.copy()
+    h.update(b"".join((timestamp.encode(), method, path.encode(), body)))
+    return timestamp, h.hexdigest()
+
+def now_iso() -> str:
+    """Naive UTC ISO-8601 timestamp, as datetime.utcnow().isoformat() produced (utcnow is deprecated)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+
+def page_params(fields: str, limit: int, offset: int, order: str):
+    """PostgREST query params for one page of a list endpoint, e.g. order="timestamp.desc"."""
+    return {"select": fields, "order": order, "limit": limit, "offset": offset}
+
+def wrap_rows(key: str, rows_json: bytes) -> bytes:
+    """Embed a PostgREST JSON array as-is in {"ok": true, key: [...]}, skipping a parse/re-encode."""
+    return b'{"ok":true,"%s":%s}' % (key.encode(), rows_json)
@@ -1,16 +1,20 @@
 # routes_valr_trade.py
-from fastapi import APIRouter
-import os, time, json, hmac, hashlib, httpx
+from fastapi import APIRouter, Request
+from fastapi.responses import Response
+import os, time, asyncio, logging, httpx, orjson
 from typing import Dict, Any
-from datetime import datetime
+from common import Fields, Limit, Offset, now_iso, page_params, valr_signature, wrap_rows
 
 router = APIRouter()
+logger = logging.getLogger("netzer")
 
 SUPABASE_URL = os.getenv("SUPABASE_URL", "").rstrip("/")
 SUPABASE_SERVICE_ROLE = os.getenv("SUPABASE_SERVICE_ROLE") or os.getenv("SUPABASE_KEY") or ""
 VALR_API_KEY = os.getenv("VALR_API_KEY", "")
 VALR_API_SECRET = os.getenv("VALR_API_SECRET", "")
 PAIR = "USDTZAR"
+VALR_BALANCES_PATH = "/v1/account/balances"
+VALR_MARKET_ORDER_PATH = "/v1/orders/market"
 
 def sb_headers() -> Dict[str, str]:
     return {
@@ -19,104 +23,108 @@ def sb_headers() -> Dict[str, str]:
         "Content-Type": "application/json",
     }
 
-def valr_sign(method: str, path: str, body: str = "") -> Dict[str, str]:
-    ts = str(int(time.time() * 1000))
-    payload = ts + method.upper() + path + body
-    sig = hmac.new(VALR_API_SECRET.encode("utf-8"), payload.encode("utf-8"), hashlib.sha512).hexdigest()
+def valr_sign(method: bytes, path: str, body: bytes = b"") -> Dict[str, str]:
+    ts, sig = valr_signature(method, path, body)
     return {"X-VALR-API-KEY": VALR_API_KEY, "X-VALR-SIGNATURE": sig, "X-VALR-TIMESTAMP": ts}
 
 async def valr_get(client: httpx.AsyncClient, path: str):
-    headers = valr_sign("GET", path, "")
-    r = await client.get("https://api.valr.com" + path, headers=headers, timeout=30)
+    headers = valr_sign(b"GET", path)
+    r = await client.get(path, headers=headers, timeout=30)
     r.raise_for_status()
-    return r.json()
+    return orjson.loads(r.content)
 
 async def valr_post(client: httpx.AsyncClient, path: str, json_body: Dict[str, Any]):
-    body = json.dumps(json_body, separators=(",", ":"))
-    headers = valr_sign("POST", path, body)
+    body = orjson.dumps(json_body)  # compact; signed and sent as the same bytes
+    headers = valr_sign(b"POST", path, body)
     headers["Content-Type"] = "application/json"
-    r = await client.post("https://api.valr.com" + path, headers=headers, content=body, timeout=30)
+    r = await client.post(path, headers=headers, content=body, timeout=30)
     r.raise_for_status()
-    return r.json() if r.content else {}
+    return orjson.loads(r.content) if r.content else {}
 
-async def insert_execution(rec: Dict[str, Any]):
-    async with httpx.AsyncClient() as c:
-        r = await c.post(
-            f"{SUPABASE_URL}/rest/v1/executions",
+async def insert_execution(sb: httpx.AsyncClient, rec: Dict[str, Any]):
+    try:
+        r = await sb.post(
+            "/executions",
             headers={**sb_headers(), "Prefer": "return=representation"},
             json=rec,
             timeout=30,
         )
-        ok = r.status_code < 300
-        try:
-            data = r.json() if ok else {"error": r.text}
-        except Exception:
-            data = {"raw": r.text}
-        return {"ok": ok, "resp": data}
+    except httpx.HTTPError as e:
+        logger.error("Execution %s not stored: %r", rec.get("exchange_order_id"), e)
+        return {"ok": False, "resp": {"error": repr(e)}}
+    ok = r.status_code < 300
+    try:
+        data = orjson.loads(r.content) if ok else {"error": r.text}
+    except Exception:
+        data = {"raw": r.text}
+    if not ok:
+        logger.error("Execution %s not stored: %s", rec.get("exchange_order_id"), data)
+    return {"ok": ok, "resp": data}
 
-@router.post("/valr/auto-trade")
-async def auto_trade():
+@router.post("/valr/auto-trade", response_model=None)
+async def auto_trade(request: Request):
     if not (SUPABASE_URL and SUPABASE_SERVICE_ROLE and VALR_API_KEY and VALR_API_SECRET):
         return {"ok": False, "error": "Missing env vars"}
 
-    async with httpx.AsyncClient() as client:
-        balances = await valr_get(client, "/v1/account/balances")
-
-        def avail(symbol: str) -> float:
-            for b in balances:
-                if b.get("currency") == symbol:
-                    return float(b.get("available") or 0)
-            return 0.0
+    client = request.app.state.valr
+    balances = await valr_get(client, VALR_BALANCES_PATH)
 
-        zar = avail("ZAR")
-        usdt = avail("USDT")
-        MIN_ZAR, MIN_USDT = 10.0, 1.0
-        side, payload, resp = None, None, {}
+    available = {b["currency"]: b.get("available") for b in balances if b.get("currency")}
+    zar = float(available.get("ZAR") or 0)
+    usdt = float(available.get("USDT") or 0)
+    MIN_ZAR, MIN_USDT = 10.0, 1.0
+    side, payload, resp = None, None, {}
 
-        if zar >= MIN_ZAR:
-            side = "BUY"
-            payload = {"pair": PAIR, "side": "BUY", "quoteAmount": zar, "timeInForce": "IOC"}
-            resp = await valr_post(client, "/v1/orders/market", payload)
-        elif usdt >= MIN_USDT:
-            side = "SELL"
-            payload = {"pair": PAIR, "side": "SELL", "baseAmount": usdt, "timeInForce": "IOC"}
-            resp = await valr_post(client, "/v1/orders/market", payload)
-        else:
-            return {"ok": True, "action": "NOOP", "zar": zar, "usdt": usdt}
+    if zar >= MIN_ZAR:
+        side = "BUY"
+        payload = {"pair": PAIR, "side": "BUY", "quoteAmount": zar, "timeInForce": "IOC"}
+        resp = await valr_post(client, VALR_MARKET_ORDER_PATH, payload)
+    elif usdt >= MIN_USDT:
+        side = "SELL"
+        payload = {"pair": PAIR, "side": "SELL", "baseAmount": usdt, "timeInForce": "IOC"}
+        resp = await valr_post(client, VALR_MARKET_ORDER_PATH, payload)
+    else:
+        return {"ok": True, "action": "NOOP", "zar": zar, "usdt": usdt}
 
-        order_id = resp.get("id") or resp.get("orderId") or f"VALR-{int(time.time())}"
-        record = {
-            "client_id": "auto",
-            "side": side,
-            "pair": PAIR,
-            "zar_amount": zar if side == "BUY" else None,
-            "usdt_amount": usdt if side == "SELL" else None,
-            "exchange_order_id": order_id,
-            "status": "SUBMITTED",
-            "created_at": datetime.utcnow().isoformat(),
-        }
-        ins = await insert_execution(record)
+    order_id = resp.get("id") or resp.get("orderId") or f"VALR-{int(time.time())}"
+    record = {
+        "client_id": "auto",
+        "side": side,
+        "pair": PAIR,
+        "zar_amount": zar if side == "BUY" else None,
+        "usdt_amount": usdt if side == "SELL" else None,
+        "exchange_order_id": order_id,
+        "status": "SUBMITTED",
+        "created_at": now_iso(),
+    }
+    # Started as a task and awaited before replying, so the caller still sees the insert result
+    ins_task = asyncio.create_task(insert_execution(request.app.state.sb, record))
 
-        return {
-            "ok": True,
-            "side": side,
-            "zar_before": zar,
-            "usdt_before": usdt,
-            "order_payload": payload,
-            "exchange_response": resp,
-            "supabase_insert": ins,
-        }
+    return {
+        "ok": True,
+        "side": side,
+        "zar_before": zar,
+        "usdt_before": usdt,
+        "order_payload": payload,
+        "exchange_response": resp,
+        "supabase_insert": await ins_task,
+    }
 
 @router.get("/executions/recent")
-async def recent(limit: int = 20):
+async def recent(
+    request: Request,
+    limit: Limit = 20,
+    offset: Offset = 0,
+    fields: Fields = "*",
+):
     if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE:
         return {"ok": False, "error": "Missing SUPABASE env vars"}
-    async with httpx.AsyncClient() as c:
-        r = await c.get(
-            f"{SUPABASE_URL}/rest/v1/executions?select=*&order=created_at.desc&limit={limit}",
-            headers=sb_headers(),
-            timeout=30,
-        )
-    ok = r.status_code < 300
-    data = r.json() if ok else {"error": r.text}
-    return {"ok": ok, "executions": dat
+    r = await request.app.state.sb.get(
+        "/executions",
+        params=page_params(fields, limit, offset, order="created_at.desc"),
+        headers=sb_headers(),
+        timeout=30,
+    )
+    if r.status_code >= 300:
+        return {"ok": False, "executions": {"error": r.text}}
+    return Response(content=wrap_rows("executions", r.content), media_type="application/json")
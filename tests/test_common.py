@@ -0,0 +1,16 @@
+# tests/test_common.py — helpers shared by app.py and routes_valr_trade.py
+from datetime import datetime
+
+import app
+import common
+import routes_valr_trade
+
+def test_now_iso_is_naive_utc_isoformat():
+    stamp = common.now_iso()
+    parsed = datetime.fromisoformat(stamp)
+    assert parsed.tzinfo is None
+    assert parsed.isoformat() == stamp
+
+def test_webhooks_and_auto_trade_share_now_iso():
+    assert app.now_iso is common.now_iso
+    assert routes_valr_trade.now_iso is common.now_iso
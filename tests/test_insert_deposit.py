@@ -0,0 +1,84 @@
+# tests/test_insert_deposit.py — insert_deposit against a mocked PostgREST
+import asyncio
+import logging
+
+import httpx
+import pytest
+
+import app
+
+RECORD = {
+    "client_id": "A123",
+    "amount_zar": 10000.0,
+    "stitch_txid": "STCH-001",
+    "timestamp": "2025-10-17T10:00:00.000000",
+    "status": "completed",
+}
+
+def run_insert(responses):
+    """Run insert_deposit against a PostgREST mock replaying `responses`; return the requests seen."""
+    seen = []
+
+    def handler(request: httpx.Request):
+        seen.append(request)
+        result = responses[len(seen) - 1]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def main():
+        async with httpx.AsyncClient(
+            transport=httpx.MockTransport(handler), base_url="https://sb.test/rest/v1"
+        ) as client:
+            await app.insert_deposit(client, RECORD)
+
+    asyncio.run(main())
+    return seen
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(app, "SB_RETRY_BACKOFF", 0)
+    app._read_cache.clear()
+
+def test_created_invalidates_deposit_caches():
+    app.cache_set(("deposits", "*", 100, 0), b"[]", 30)
+    seen = run_insert([httpx.Response(201)])
+    assert len(seen) == 1
+    assert seen[0].url.path == "/rest/v1/deposits"
+    assert "on_conflict" not in seen[0].url.params
+    assert app._read_cache == {}
+
+def test_4xx_is_not_retried_and_is_logged(caplog):
+    with caplog.at_level(logging.ERROR, logger="netzer"):
+        seen = run_insert([httpx.Response(400, json={"message": "bad column"})] * 3)
+    assert len(seen) == 1
+    assert "STCH-001 not stored: HTTP 400" in caplog.text
+
+def test_5xx_is_retried_then_logged(caplog):
+    with caplog.at_level(logging.ERROR, logger="netzer"):
+        seen = run_insert([httpx.Response(503)] * app.SB_WRITE_ATTEMPTS)
+    assert len(seen) == app.SB_WRITE_ATTEMPTS
+    assert "STCH-001 not stored: HTTP 503" in caplog.text
+
+def test_timeout_then_success_is_retried(caplog):
+    with caplog.at_level(logging.ERROR, logger="netzer"):
+        seen = run_insert([httpx.ReadTimeout("slow"), httpx.Response(201)])
+    assert len(seen) == 2
+    assert caplog.text == ""
+
+def test_timeout_then_duplicate_txid_counts_as_stored(caplog):
+    conflict = httpx.Response(409, json={
+        "code": "23505",
+        "message": 'duplicate key value violates unique constraint "deposits_stitch_txid_key"',
+        "details": "Key (stitch_txid)=(STCH-001) already exists.",
+    })
+    with caplog.at_level(logging.ERROR, logger="netzer"):
+        seen = run_insert([httpx.ReadTimeout("slow"), conflict])
+    assert len(seen) == 2
+    assert caplog.text == ""
+
+def test_other_conflict_is_logged(caplog):
+    with caplog.at_level(logging.ERROR, logger="netzer"):
+        seen = run_insert([httpx.Response(409, json={"details": "Key (id)=(7) already exists."})])
+    assert len(seen) == 1
+    assert "STCH-001 not stored: HTTP 409" in caplog.text